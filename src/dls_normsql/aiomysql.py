@@ -5,6 +5,7 @@ import logging
 import os
 import warnings
 from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Any, List
 
@@ -76,6 +77,9 @@ class Aiomysql:
 
         self.__backup_restore_lock = asyncio.Lock()
 
+        # True while inside a transaction() context.
+        self.__in_transaction = False
+
         # Last undo position.
         self.__last_restore = 0
 
@@ -257,8 +261,12 @@ class Aiomysql:
     async def begin(self):
         """
         Begin transaction.
+        Does nothing when inside a transaction() context.
         """
 
+        if self.__in_transaction:
+            return
+
         logger.debug("beginning transaction")
 
         await self.__connection.begin()
@@ -267,8 +275,12 @@ class Aiomysql:
     async def commit(self):
         """
         Commit transaction.
+        Deferred until the end of the context when inside a transaction() context.
         """
 
+        if self.__in_transaction:
+            return
+
         logger.debug("committing transaction")
 
         await self.__connection.commit()
@@ -282,6 +294,37 @@ class Aiomysql:
 
         await self.__connection.rollback()
 
+    # ----------------------------------------------------------------------------------------
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Async context manager which holds a single transaction
+        across all the inserts, updates and executes done inside it.
+        Commits on exit, or rolls back if an exception is raised.
+        A nested transaction() simply joins the one already underway.
+        """
+
+        if self.__in_transaction:
+            yield
+            return
+
+        logger.debug("beginning transaction context")
+
+        await self.__connection.begin()
+        self.__in_transaction = True
+
+        try:
+            yield
+        except BaseException:
+            self.__in_transaction = False
+            logger.debug("rolling back transaction context")
+            await self.__connection.rollback()
+            raise
+
+        self.__in_transaction = False
+        logger.debug("committing transaction context")
+        await self.__connection.commit()
+
     # ----------------------------------------------------------------------------------------
     async def create_schemas(self):
 
@@ -360,7 +403,7 @@ class Aiomysql:
         if isinstance(table, str):
             table = require("table definitions", self.__tables, table)
 
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        now = datetime.now().isoformat(sep=" ", timespec="microseconds")
 
         values_rows = []
 
@@ -520,7 +563,11 @@ class Aiomysql:
                     raise RuntimeError(f"failed to execute {why}: {sql}")
 
     # ----------------------------------------------------------------------------------------
-    async def query(self, sql, subs=None, why=None):
+    async def query(self, sql, subs=None, why=None, cacheable=False):
+        """
+        Query records.
+        The cacheable flag is accepted for compatibility, but records are not cached.
+        """
 
         if subs is None:
             subs = {}
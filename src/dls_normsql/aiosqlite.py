@@ -1,13 +1,17 @@
 import asyncio
-import glob
+import functools
+import heapq
 
 # This class produces log entries.
 import logging
+import operator
 import os
 import re
-import shutil
-from collections import OrderedDict
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
+from pathlib import Path
+from typing import Union
 
 import aiosqlite
 
@@ -20,18 +24,150 @@ from dls_utilpack.require import require
 from dls_normsql.constants import CommonFieldnames, RevisionFieldnames, Tablenames
 from dls_normsql.table_definition import TableDefinition
 
+# Google's re2 is optional, see the regexp_engine setting below.
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 logger = logging.getLogger(__name__)
 
 connect_lock = asyncio.Lock()
 apply_revisions_lock = asyncio.Lock()
 
+# Pragmas issued on every new connection.
+# Individual values can be overridden, or dropped by giving None,
+# in the "pragmas" dict of the specification's type_specific_tbd.
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "busy_timeout": 5000,
+    "wal_autocheckpoint": 1000,
+}
+
+# Maximum number of rows handed to a single executemany during insert.
+INSERT_CHUNK_SIZE = 500
+
+# Number of rows fetched at a time when iterating over query results.
+QUERY_CHUNK_SIZE = 1000
+
+# Maximum number of idle cursors kept for reuse by queries.
+CURSOR_POOL_SIZE = 4
+
+# Seconds a cacheable query's records are reused for, unless given in the specification.
+DEFAULT_QUERY_CACHE_TTL = 5.0
+
+# Maximum number of distinct cacheable queries held before the cache is emptied.
+QUERY_CACHE_SIZE = 256
+
+# Maximum number of distinct query sql strings whose column names are held.
+COLUMNS_CACHE_SIZE = 256
+
+# Pragmas from the configured ones which also apply to the read-only connection.
+READER_PRAGMA_NAMES = ["temp_store", "mmap_size", "cache_size", "busy_timeout"]
+
+# Engines for the sqlite REGEXP function, chosen by "regexp_engine" in type_specific_tbd.
+# The default "re" is Python's re.
+# "re2" needs the google-re2 package, and matches in linear time without backtracking.
+# But its semantics differ from re, for example:
+#   $ only matches at the very end, so a$ doesn't match "a\n",
+#   \d only matches ASCII digits,
+#   POSIX classes like [[:alpha:]] are understood.
+# Patterns re2 can't compile, such as backreferences or lookahead, fall back to re.
+REGEXP_ENGINE_RE = "re"
+REGEXP_ENGINE_RE2 = "re2"
+
+# Escapes in an ASCII pattern which can still match differently on ASCII input under re.ASCII:
+#   \s and \S, since in unicode \s also matches \x1c-\x1f,
+#   \N, \u and \U, which can name non-ASCII characters that case-fold to ASCII,
+#   such as (?i)\N{KELVIN SIGN} matching "K".
+UNICODE_ONLY_ESCAPES = ("\\s", "\\S", "\\N", "\\u", "\\U")
+
+
+# ----------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=256)
+def sqlite_regexp_compile(pattern, is_ascii_input=False):
+    # The same pattern is typically applied to every row in a scan, so compile it only once.
+
+    # ASCII matching skips the unicode character tables and finds the same matches
+    # when pattern and input are both ASCII, except for the UNICODE_ONLY_ESCAPES.
+    if (
+        is_ascii_input
+        and pattern.isascii()
+        and not any(escape in pattern for escape in UNICODE_ONLY_ESCAPES)
+    ):
+        try:
+            return re.compile(pattern, re.ASCII)
+        except ValueError:
+            # The pattern has an inline (?u) flag, which can't be combined with ASCII.
+            pass
+
+    return re.compile(pattern)
+
 
 # ----------------------------------------------------------------------------------------
 def sqlite_regexp_callback(pattern, input):
-    reg = re.compile(pattern)
+    reg = sqlite_regexp_compile(pattern, input.isascii())
+    return reg.search(input) is not None
+
+
+# ----------------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=256)
+def sqlite_re2_regexp_compile(pattern):
+    # Don't let re2 log to stderr when it can't parse a pattern.
+    options = re2.Options()
+    options.log_errors = False
+
+    try:
+        return re2.compile(pattern, options=options)
+    except re2.error:
+        # Fall back to re for constructs re2 doesn't support, such as backreferences.
+        return sqlite_regexp_compile(pattern)
+
+
+# ----------------------------------------------------------------------------------------
+def sqlite_re2_regexp_callback(pattern, input):
+    reg = sqlite_re2_regexp_compile(pattern)
     return reg.search(input) is not None
 
 
+# ----------------------------------------------------------------------------------------
+def values_getter(fields):
+    """
+    Make a function which returns a row's values for the fields as a tuple.
+    Raises KeyError for a row which is missing any of the fields.
+    """
+
+    if len(fields) == 0:
+        return lambda row: ()
+
+    # Itemgetter with a single field returns the bare value.
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda row: (row[field],)
+
+    return operator.itemgetter(*fields)
+
+
+# ----------------------------------------------------------------------------------------
+def created_on_isoformat(created_on):
+    """
+    Convert an integer created_on, in microseconds since the epoch,
+    to the local time text which text created_on fields hold.
+    """
+
+    seconds, microseconds = divmod(created_on, 1000000)
+
+    return (
+        datetime.fromtimestamp(seconds)
+        .replace(microsecond=microseconds)
+        .isoformat(sep=" ", timespec="microseconds")
+    )
+
+
 # ----------------------------------------------------------------------------------------
 class Aiosqlite:
     """
@@ -50,6 +186,32 @@ class Aiosqlite:
         # Default is an empty type_specific_tbd.
         self.__type_specific_tbd = specification.get("type_specific_tbd", {})
 
+        # Pragmas to issue at connect time, with any overrides from the specification.
+        self.__pragmas = dict(DEFAULT_PRAGMAS)
+        self.__pragmas.update(self.__type_specific_tbd.get("pragmas", {}))
+
+        # Engine behind the sqlite REGEXP function.
+        regexp_engine = self.__type_specific_tbd.get("regexp_engine", REGEXP_ENGINE_RE)
+        if regexp_engine == REGEXP_ENGINE_RE:
+            self.__regexp_callback = sqlite_regexp_callback
+        elif regexp_engine == REGEXP_ENGINE_RE2:
+            if re2 is None:
+                raise RuntimeError(
+                    "configuration error: regexp_engine re2 needs the google-re2 package"
+                )
+            self.__regexp_callback = sqlite_re2_regexp_callback
+        else:
+            raise RuntimeError(
+                f"configuration error: unknown regexp_engine {regexp_engine}"
+            )
+
+        # Optionally open a second, read-only, connection for queries.
+        # This only makes sense in WAL mode, where readers don't wait for the writer.
+        self.__should_use_reader = (
+            self.__type_specific_tbd.get("reader_connection", False)
+            and str(self.__pragmas.get("journal_mode")).upper() == "WAL"
+        )
+
         # Backup directory default is the path where the filename is.
         self.__backup_directory = specification.get(
             "backup_directory", os.path.dirname(self.__filename)
@@ -60,6 +222,7 @@ class Aiosqlite:
         logging.getLogger("aiosqlite").setLevel(level)
 
         self.__connection = None
+        self.__reader = None
 
         self.__database_definition_object = database_definition_object
 
@@ -67,6 +230,27 @@ class Aiosqlite:
 
         self.__backup_restore_lock = asyncio.Lock()
 
+        # True while inside a transaction() context.
+        self.__in_transaction = False
+
+        # Prepared sql and field lists, keyed by (table name, frozenset of row keys).
+        self.__insert_sql_cache = {}
+        self.__update_sql_cache = {}
+
+        # Records of cacheable queries, keyed by (sql, subs), with the time they were fetched.
+        self.__query_cache = {}
+        self.__query_cache_ttl = self.__type_specific_tbd.get(
+            "query_cache_ttl", DEFAULT_QUERY_CACHE_TTL
+        )
+
+        # Column names of query results, keyed by sql.
+        # Emptied whenever the schema may have been changed through this object.
+        self.__columns_cache = {}
+
+        # Idle cursors on the current connections, reused by queries.
+        self.__cursor_pool = asyncio.Queue(maxsize=CURSOR_POOL_SIZE)
+        self.__reader_cursor_pool = asyncio.Queue(maxsize=CURSOR_POOL_SIZE)
+
         # Last undo position.
         self.__last_restore = 0
 
@@ -81,7 +265,7 @@ class Aiosqlite:
             should_create_schemas = False
 
             # File doesn't exist yet?
-            if not os.path.isfile(self.__filename):
+            if not await asyncio.to_thread(os.path.isfile, self.__filename):
                 # Create directory for the file.
                 await self.__create_directory(self.__filename)
                 # After connection, we must create the schemas.
@@ -89,10 +273,14 @@ class Aiosqlite:
 
             logger.debug(f"connecting to {self.__filename}")
 
-            self.__connection = await aiosqlite.connect(self.__filename)
+            self.__connection = await aiosqlite.connect(
+                self.__filename, iter_chunk_size=QUERY_CHUNK_SIZE
+            )
             self.__connection.row_factory = aiosqlite.Row
 
-            await self.__connection.create_function("regexp", 2, sqlite_regexp_callback)
+            await self.__apply_pragmas(self.__connection, self.__pragmas)
+
+            await self.__connection.create_function("regexp", 2, self.__regexp_callback)
 
             # Let the base class contribute its table definitions to the in-memory list.
             await self.add_table_definitions()
@@ -104,13 +292,63 @@ class Aiosqlite:
                     [{"number": self.__database_definition_object.LATEST_REVISION}],
                 )
                 # TODO: Set permission on sqlite file from configuration.
-                os.chmod(self.__filename, 0o666)
+                await asyncio.to_thread(os.chmod, self.__filename, 0o666)
+
+            if self.__should_use_reader:
+                await self.__connect_reader()
 
             # Emit the name of the database file for positive confirmation on console.
             logger.info(
                 f"{callsign(self)} database file is {self.__filename} database definition revision {self.__database_definition_object.LATEST_REVISION}"
             )
 
+    # ----------------------------------------------------------------------------------------
+    async def __connect_reader(self):
+        """
+        Open the read-only connection used by queries.
+        """
+
+        uri = f"{Path(self.__filename).absolute().as_uri()}?mode=ro"
+
+        logger.debug(f"connecting reader to {uri}")
+
+        self.__reader = await aiosqlite.connect(
+            uri, uri=True, iter_chunk_size=QUERY_CHUNK_SIZE
+        )
+        self.__reader.row_factory = aiosqlite.Row
+
+        pragmas = {
+            name: self.__pragmas[name]
+            for name in READER_PRAGMA_NAMES
+            if name in self.__pragmas
+        }
+        pragmas["query_only"] = 1
+
+        await self.__apply_pragmas(self.__reader, pragmas)
+
+        await self.__reader.create_function("regexp", 2, self.__regexp_callback)
+
+    # ----------------------------------------------------------------------------------------
+    async def __apply_pragmas(self, connection, pragmas):
+        """
+        Issue the given pragmas on the newly opened connection.
+        """
+
+        pragmas_sql = []
+        for name, value in pragmas.items():
+            if value is None:
+                continue
+            pragmas_sql.append(f"PRAGMA {name}={value};")
+
+        if len(pragmas_sql) == 0:
+            return
+
+        sql = "\n".join(pragmas_sql)
+
+        logger.debug(f"applying pragmas\n{sql}")
+
+        await connection.executescript(sql)
+
     # ----------------------------------------------------------------------------------------
     async def apply_revisions(self):
         """
@@ -180,6 +418,23 @@ class Aiosqlite:
             # Commit any uncommitted transactions.
             await self.commit()
 
+            self.__query_cache.clear()
+            self.__columns_cache.clear()
+
+            # Pooled cursors belong to the connections being closed.
+            # New pools keep cursors still in use from being released into them.
+            cursor_pools = [self.__cursor_pool, self.__reader_cursor_pool]
+            self.__cursor_pool = asyncio.Queue(maxsize=CURSOR_POOL_SIZE)
+            self.__reader_cursor_pool = asyncio.Queue(maxsize=CURSOR_POOL_SIZE)
+            for cursor_pool in cursor_pools:
+                while not cursor_pool.empty():
+                    await cursor_pool.get_nowait().close()
+
+            if self.__reader is not None:
+                logger.debug(f"[DISSHU] {callsign(self)} disconnecting reader")
+                await self.__reader.close()
+                self.__reader = None
+
             logger.debug(f"[DISSHU] {callsign(self)} disconnecting")
             await self.__connection.close()
             self.__connection = None
@@ -189,6 +444,12 @@ class Aiosqlite:
 
         directory, filename = os.path.split(filename)
 
+        # Filesystem calls can be slow on network storage, so keep them off the event loop.
+        await asyncio.to_thread(self.__create_directory_blocking, directory)
+
+    # ----------------------------------------------------------------------------------------
+    def __create_directory_blocking(self, directory):
+
         if not os.path.exists(directory):
             # Make sure that parent directories which get created will have public permission.
             umask = os.umask(0)
@@ -201,6 +462,25 @@ class Aiosqlite:
 
         self.__tables[table_definition.name] = table_definition
 
+        # Prepared sql may refer to a previous definition of the table.
+        self.__insert_sql_cache.clear()
+        self.__update_sql_cache.clear()
+
+    # ----------------------------------------------------------------------------------------
+    def __resolve_table(self, table):
+        """
+        Get the table definition, presuming a string is a table name.
+        """
+
+        if not isinstance(table, str):
+            return table
+
+        try:
+            return self.__tables[table]
+        except KeyError:
+            # Let require raise its usual error for an unknown table.
+            return require("table definitions", self.__tables, table)
+
     # ----------------------------------------------------------------------------------------
     async def add_table_definitions(self):
 
@@ -213,10 +493,15 @@ class Aiosqlite:
     async def begin(self):
         """
         Begin transaction.
+        Does nothing when inside a transaction() context.
         """
 
+        if self.__in_transaction:
+            return
+
         # Close off any transactions underway.
-        await self.__connection.commit()
+        if self.__connection.in_transaction:
+            await self.__connection.commit()
 
         await self.__connection.execute("BEGIN")
 
@@ -224,8 +509,17 @@ class Aiosqlite:
     async def commit(self):
         """
         Commit transaction.
+        Deferred until the end of the context when inside a transaction() context.
         """
 
+        if self.__in_transaction:
+            return
+
+        # Nothing to commit?
+        # Checking in_transaction doesn't need a trip to the aiosqlite worker thread.
+        if not self.__connection.in_transaction:
+            return
+
         await self.__connection.commit()
 
     # ----------------------------------------------------------------------------------------
@@ -234,17 +528,59 @@ class Aiosqlite:
         Roll back transaction.
         """
 
+        # Cached records may include the changes being rolled back.
+        self.__query_cache.clear()
+
+        # Nothing to roll back?
+        if not self.__connection.in_transaction:
+            return
+
         await self.__connection.rollback()
 
+    # ----------------------------------------------------------------------------------------
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Async context manager which holds a single write transaction
+        across all the inserts, updates and executes done inside it.
+        Commits on exit, or rolls back if an exception is raised.
+        A nested transaction() simply joins the one already underway.
+        """
+
+        if self.__in_transaction:
+            yield
+            return
+
+        # Close off any transactions underway.
+        if self.__connection.in_transaction:
+            await self.__connection.commit()
+
+        await self.__connection.execute("BEGIN IMMEDIATE")
+        self.__in_transaction = True
+
+        try:
+            yield
+        except BaseException:
+            self.__in_transaction = False
+            # Also drops cached query results which saw the rolled back changes.
+            await self.rollback()
+            raise
+
+        self.__in_transaction = False
+        await self.__connection.commit()
+
     # ----------------------------------------------------------------------------------------
     async def create_schemas(self):
 
-        await self.begin()
+        # Close off any transactions underway.
+        await self.commit()
+
+        statements = []
+        for table in self.__tables.values():
+            statements.extend(self.__create_table_statements(table))
 
         try:
-            for table in self.__tables.values():
-                await self.create_table(table)
-            await self.commit()
+            await self.__execute_statements(statements)
         except Exception:
             await self.rollback()
 
@@ -254,32 +590,63 @@ class Aiosqlite:
         Wipe and re-create the table in the database.
         """
 
-        # If table is a string, presume it's a table name.
-        if isinstance(table, str):
-            table = require("table definitions", self.__tables, table)
+        table = self.__resolve_table(table)
 
-        await self.__connection.execute("DROP TABLE IF EXISTS %s" % (table.name))
+        await self.__execute_statements(self.__create_table_statements(table))
+
+    # ----------------------------------------------------------------------------------------
+    def __create_table_statements(self, table):
+        """
+        List the sql statements which wipe and re-create the table.
+        """
+
+        statements = [f"DROP TABLE IF EXISTS {table.name}"]
 
         fields_sql = []
         indices_sql = []
 
-        for field_name in table.fields:
-            field = table.fields[field_name]
-            fields_sql.append("`%s` %s" % (field_name, field["type"]))
+        for field_name, field in table.fields.items():
+            fields_sql.append(f"`{field_name}` {field['type']}")
             if field.get("index"):
                 indices_sql.append(
-                    "CREATE INDEX `%s_%s` ON `%s`(`%s`)"
-                    % (table.name, field_name, table.name, field_name)
+                    f"CREATE INDEX `{table.name}_{field_name}` ON `{table.name}`(`{field_name}`)"
                 )
 
-        sql = "CREATE TABLE `%s`\n(%s)" % (table.name, ",\n  ".join(fields_sql))
+        columns_sql = ",\n  ".join(fields_sql)
+        sql = f"CREATE TABLE `{table.name}`\n({columns_sql})"
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("\n%s\n%s", sql, "\n".join(indices_sql))
 
-        logger.debug("\n%s\n%s" % (sql, "\n".join(indices_sql)))
+        statements.append(sql)
+        statements.extend(indices_sql)
 
-        await self.__connection.execute(sql)
+        return statements
 
-        for sql in indices_sql:
-            await self.__connection.execute(sql)
+    # ----------------------------------------------------------------------------------------
+    async def __execute_statements(self, statements):
+        """
+        Execute statements as a single transactional script,
+        which takes one trip to the aiosqlite worker thread.
+        """
+
+        self.__query_cache.clear()
+        self.__columns_cache.clear()
+
+        # Executing a script would commit the transaction underway, so stay inside it instead.
+        if self.__connection.in_transaction:
+            for sql in statements:
+                await self.__connection.execute(sql)
+            return
+
+        script = ";\n".join(["BEGIN"] + statements + ["COMMIT"]) + ";"
+
+        try:
+            await self.__connection.executescript(script)
+        except BaseException:
+            # A failed script stops before its COMMIT, leaving the transaction open.
+            await self.rollback()
+            raise
 
     # ----------------------------------------------------------------------------------------
     async def insert(
@@ -294,54 +661,76 @@ class Aiosqlite:
         The first row is expected to define the keys for all rows inserted.
         Keys in the rows are ignored if not defined in the table schema.
         Table schema columns not specified in the first row's keys will get their sql-defined default values.
+        A missing created_on gets the current time, as microseconds since the epoch
+        if the field's type is INTEGER, otherwise as isoformat text.
+        Rows are handed to sqlite in chunks of INSERT_CHUNK_SIZE.
+        When calling this repeatedly, wrap the calls in transaction() to commit them together.
         """
 
         if len(rows) == 0:
             return
 
-        # If table is a string, presume it's a table name.
-        if isinstance(table, str):
-            table = require("table definitions", self.__tables, table)
+        table = self.__resolve_table(table)
 
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        # The first row is expected to define the keys for all rows inserted.
+        cache_key = (table.name, frozenset(rows[0].keys()))
+        cached = self.__insert_sql_cache.get(cache_key)
+        if cached is None:
+            # The created_on field, which gets defaulted if not given, goes last.
+            insertable_fields = []
+            has_created_on = False
+            for field in table.fields:
+                if field == CommonFieldnames.CREATED_ON:
+                    has_created_on = True
+                elif field in rows[0]:
+                    insertable_fields.append(field)
 
-        values_rows = []
+            getter = values_getter(insertable_fields)
 
-        insertable_fields = []
-        for field in table.fields:
-            # The first row is expected to define the keys for all rows inserted.
-            if field in rows[0]:
-                insertable_fields.append(field)
-            elif field == CommonFieldnames.CREATED_ON:
-                insertable_fields.append(field)
+            if has_created_on:
+                insertable_fields.append(CommonFieldnames.CREATED_ON)
+                # Sqlite gives any column type containing INT integer affinity.
+                created_on_type = table.fields[CommonFieldnames.CREATED_ON]["type"]
+                created_on_is_integer = "INT" in created_on_type.upper()
+            else:
+                created_on_is_integer = False
 
-        qmarks = ["?"] * len(insertable_fields)
+            fields_sql = ", ".join(insertable_fields)
+            qmarks_sql = ", ".join(["?"] * len(insertable_fields))
 
-        for row in rows:
-            values_row = []
-            for field in table.fields:
-                if field == CommonFieldnames.CREATED_ON:
-                    created_on = row.get(field)
-                    if created_on is None:
-                        created_on = now
-                    values_row.append(created_on)
-                elif field in row:
-                    values_row.append(row[field])
-            values_rows.append(values_row)
-
-        sql = "INSERT INTO %s\n  (%s)\n  VALUES (%s)" % (
-            table.name,
-            ", ".join(insertable_fields),
-            ", ".join(qmarks),
-        )
+            sql = f"INSERT INTO {table.name}\n  ({fields_sql})\n  VALUES ({qmarks_sql})"
+
+            cached = (sql, getter, has_created_on, created_on_is_integer)
+            self.__insert_sql_cache[cache_key] = cached
+
+        sql, getter, has_created_on, created_on_is_integer = cached
+
+        self.__query_cache.clear()
+
+        # Integer created_on fields hold microseconds since the epoch, text ones hold isoformat.
+        now: Union[int, str, None]
+        if not has_created_on:
+            now = None
+        elif created_on_is_integer:
+            now = time.time_ns() // 1000
+        else:
+            now = datetime.now().isoformat(sep=" ", timespec="microseconds")
 
         try:
-            await self.__connection.executemany(sql, values_rows)
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                # Values are generated as sqlite binds them, rather than built up front.
+                values_rows = self.__insert_values_rows(
+                    rows[start : start + INSERT_CHUNK_SIZE],
+                    getter,
+                    has_created_on,
+                    now,
+                )
+                await self.__connection.executemany(sql, values_rows)
 
             if why is None:
-                logger.debug("\n%s\n%s" % (sql, values_rows))
+                logger.debug("\n%s\n%s", sql, rows)
             else:
-                logger.debug("%s:\n%s\n%s" % (why, sql, values_rows))
+                logger.debug("%s:\n%s\n%s", why, sql, rows)
 
         except aiosqlite.OperationalError:
             if why is None:
@@ -349,6 +738,22 @@ class Aiosqlite:
             else:
                 raise RuntimeError(f"failed to execute {why}: {sql}")
 
+    # ----------------------------------------------------------------------------------------
+    def __insert_values_rows(self, rows, getter, has_created_on, now):
+        """
+        Generate the values to insert for each row, with created_on last and defaulted to now.
+        """
+
+        if not has_created_on:
+            yield from map(getter, rows)
+            return
+
+        for row in rows:
+            created_on = row.get(CommonFieldnames.CREATED_ON)
+            if created_on is None:
+                created_on = now
+            yield getter(row) + (created_on,)
+
     # ----------------------------------------------------------------------------------------
     async def update(
         self,
@@ -360,31 +765,40 @@ class Aiosqlite:
     ):
         """
         Update specified fields to all rows matching selection.
+        When calling this repeatedly, wrap the calls in transaction() to commit them together.
         """
 
-        # If table is a string, presume it's a table name.
-        if isinstance(table, str):
-            table = require("table definitions", self.__tables, table)
+        table = self.__resolve_table(table)
 
-        values_row = []
-        qmarks = []
+        cache_key = (table.name, frozenset(row.keys()))
+        cached = self.__update_sql_cache.get(cache_key)
+        if cached is None:
+            updatable_fields = []
 
-        for field in table.fields:
-            if field == CommonFieldnames.UUID or field == CommonFieldnames.AUTOID:
-                continue
-            if field not in row:
-                continue
-            qmarks.append("%s = ?" % (field))
-            values_row.append(row[field])
+            for field in table.fields:
+                if field == CommonFieldnames.UUID or field == CommonFieldnames.AUTOID:
+                    continue
+                if field not in row:
+                    continue
+                updatable_fields.append(field)
 
-        if len(values_row) == 0:
-            raise RuntimeError("no fields in record match database table")
+            if len(updatable_fields) == 0:
+                raise RuntimeError("no fields in record match database table")
 
-        sql = "UPDATE %s SET\n  %s\nWHERE %s" % (
-            table.name,
-            ",\n  ".join(qmarks),
-            where,
-        )
+            # Everything up to the where clause, which changes per call.
+            set_sql = ",\n  ".join(f"{field} = ?" for field in updatable_fields)
+            sql_prefix = f"UPDATE {table.name} SET\n  {set_sql}\nWHERE "
+
+            cached = (sql_prefix, updatable_fields)
+            self.__update_sql_cache[cache_key] = cached
+
+        sql_prefix, updatable_fields = cached
+
+        values_row = [row[field] for field in updatable_fields]
+
+        sql = sql_prefix + where
+
+        self.__query_cache.clear()
 
         if subs is not None:
             values_row.extend(subs)
@@ -394,12 +808,10 @@ class Aiosqlite:
             rowcount = cursor.rowcount
 
             if why is None:
-                logger.debug(
-                    "%d rows from:\n%s\nvalues %s" % (rowcount, sql, values_row)
-                )
+                logger.debug("%d rows from:\n%s\nvalues %s", rowcount, sql, values_row)
             else:
                 logger.debug(
-                    "%d rows from %s:\n%s\nvalues %s" % (rowcount, why, sql, values_row)
+                    "%d rows from %s:\n%s\nvalues %s", rowcount, why, sql, values_row
                 )
 
         except aiosqlite.OperationalError:
@@ -415,13 +827,18 @@ class Aiosqlite:
         """
         Execute a sql statement.
         If subs is a list of lists, then these are presumed the values for executemany.
+        When calling this repeatedly, wrap the calls in transaction() to commit them together.
         """
 
+        # The statement may change anything, including the schema, so no cached records can be trusted.
+        self.__query_cache.clear()
+        self.__columns_cache.clear()
+
         cursor = None
         try:
             # Subs is a list of lists?
             if isinstance(subs, list) and len(subs) > 0 and isinstance(subs[0], list):
-                logger.debug(f"inserting {len(subs)} of {len(subs[0])}")
+                logger.debug("inserting %d of %d", len(subs), len(subs[0]))
                 cursor = await self.__connection.executemany(sql, subs)
             else:
                 cursor = await self.__connection.execute(sql, subs)
@@ -429,17 +846,24 @@ class Aiosqlite:
             if why is None:
                 if cursor.rowcount > 0:
                     logger.debug(
-                        f"{cursor.rowcount} records affected by\n{sql} values {subs}"
+                        "%d records affected by\n%s values %s",
+                        cursor.rowcount,
+                        sql,
+                        subs,
                     )
                 else:
-                    logger.debug(f"{sql} values {subs}")
+                    logger.debug("%s values %s", sql, subs)
             else:
                 if cursor.rowcount > 0:
                     logger.debug(
-                        f"{cursor.rowcount} records affected by {why}:\n{sql} values {subs}"
+                        "%d records affected by %s:\n%s values %s",
+                        cursor.rowcount,
+                        why,
+                        sql,
+                        subs,
                     )
                 else:
-                    logger.debug(f"{why}: {sql} values {subs}")
+                    logger.debug("%s: %s values %s", why, sql, subs)
         except aiosqlite.OperationalError:
             if why is None:
                 raise RuntimeError(f"failed to execute {sql}")
@@ -468,28 +892,94 @@ class Aiosqlite:
         return parts
 
     # ----------------------------------------------------------------------------------------
-    async def query(self, sql, subs=None, why=None):
+    async def __acquire_cursor(self):
+        """
+        Get an idle cursor from the pool, or make a new one if none is available.
+        Queries go to the reader, if there is one, unless the writer has uncommitted changes.
+        Returns the cursor along with the pool it should be released to.
+        """
+
+        if self.__reader is not None and not self.__connection.in_transaction:
+            connection = self.__reader
+            pool = self.__reader_cursor_pool
+        else:
+            connection = self.__connection
+            pool = self.__cursor_pool
+
+        try:
+            return pool.get_nowait(), pool
+        except asyncio.QueueEmpty:
+            return await connection.cursor(), pool
+
+    # ----------------------------------------------------------------------------------------
+    async def __release_cursor(self, cursor, pool, is_exhausted):
+        """
+        Return a cursor to its pool, or close it if the pool is already full.
+        A cursor whose rows were not all read is always closed,
+        since its unfinished statement would keep the table locked
+        and hold the reader's snapshot.
+        """
+
+        # Pool has been replaced by disconnect() while the cursor was in use?
+        if pool is not self.__cursor_pool and pool is not self.__reader_cursor_pool:
+            try:
+                await cursor.close()
+            except (ValueError, aiosqlite.ProgrammingError):
+                # Its connection is already closed, which closed the cursor too.
+                pass
+            return
+
+        if is_exhausted:
+            try:
+                pool.put_nowait(cursor)
+                return
+            except asyncio.QueueFull:
+                pass
+
+        await cursor.close()
+
+    # ----------------------------------------------------------------------------------------
+    async def query(self, sql, subs=None, why=None, cacheable=False):
+        """
+        Query records.
+        If cacheable, the records may come from an earlier identical query,
+        as long as it is less than query_cache_ttl seconds old
+        and nothing has been written through this object in the meantime.
+        Writes by other connections are not seen until the cached records expire.
+        """
 
         if subs is None:
             subs = {}
 
+        cache_key = None
+        if cacheable:
+            cache_key = self.__query_cache_key(sql, subs)
+            records = self.__cached_query(cache_key)
+            if records is not None:
+                return records
+
         cursor = None
+        is_exhausted = False
         try:
-            cursor = await self.__connection.cursor()
+            cursor, pool = await self.__acquire_cursor()
             await cursor.execute(sql, subs)
-            rows = await cursor.fetchall()
-            cols = []
-            for col in cursor.description:
-                cols.append(col[0])
-
-            logger.debug(self.__format_debug(why, rows, sql, subs))
-
-            records = []
-            for row in rows:
-                record = OrderedDict()
-                for index, col in enumerate(cols):
-                    record[col] = row[index]
-                records.append(record)
+            cols = self.__query_columns(sql, cursor)
+
+            # Rows are fetched in chunks while the records are being built.
+            records = [dict(zip(cols, row)) async for row in cursor]
+            is_exhausted = True
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(self.__format_debug(why, records, sql, subs))
+
+            if cache_key is not None:
+                if len(self.__query_cache) >= QUERY_CACHE_SIZE:
+                    self.__query_cache.clear()
+                self.__query_cache[cache_key] = (
+                    time.monotonic(),
+                    [dict(record) for record in records],
+                )
+
             return records
         except aiosqlite.OperationalError as exception:
             if why is None:
@@ -498,7 +988,134 @@ class Aiosqlite:
                 raise RuntimeError(explain(exception, f"executing {why}: {sql}"))
         finally:
             if cursor is not None:
-                await cursor.close()
+                await self.__release_cursor(cursor, pool, is_exhausted)
+
+    # ----------------------------------------------------------------------------------------
+    def __query_columns(self, sql, cursor):
+        """
+        Column names of the executed query, from the cache if this sql has been seen before.
+        """
+
+        cols = self.__columns_cache.get(sql)
+        if cols is None:
+            if len(self.__columns_cache) >= COLUMNS_CACHE_SIZE:
+                self.__columns_cache.clear()
+            cols = tuple(col[0] for col in cursor.description)
+            self.__columns_cache[sql] = cols
+
+        return cols
+
+    # ----------------------------------------------------------------------------------------
+    def __query_cache_key(self, sql, subs):
+        """
+        Make a hashable key from the query, or None if the substitutions can't be hashed.
+        """
+
+        if isinstance(subs, dict):
+            subs = tuple(sorted(subs.items()))
+        else:
+            subs = tuple(subs)
+
+        key = (sql, subs)
+
+        try:
+            hash(key)
+        except TypeError:
+            return None
+
+        return key
+
+    # ----------------------------------------------------------------------------------------
+    def __cached_query(self, cache_key):
+        """
+        Copy of the cached records for the query, or None if there are none still fresh.
+        """
+
+        if cache_key is None:
+            return None
+
+        cached = self.__query_cache.get(cache_key)
+        if cached is None:
+            return None
+
+        fetched_at, records = cached
+        if time.monotonic() - fetched_at >= self.__query_cache_ttl:
+            del self.__query_cache[cache_key]
+            return None
+
+        # Callers are free to modify the records they are given.
+        return [dict(record) for record in records]
+
+    # ----------------------------------------------------------------------------------------
+    async def iterquery(self, sql, subs=None, why=None):
+        """
+        Async generator variant of query which yields records one at a time.
+        Use this instead of query for result sets too large to hold in memory.
+        To stop iterating early, wrap the generator in contextlib.aclosing,
+        so its unfinished statement is closed before any following writes.
+        """
+
+        if subs is None:
+            subs = {}
+
+        cursor = None
+        is_exhausted = False
+        try:
+            cursor, pool = await self.__acquire_cursor()
+            await cursor.execute(sql, subs)
+            cols = self.__query_columns(sql, cursor)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(self.__format_debug(why, None, sql, subs))
+
+            async for row in cursor:
+                yield dict(zip(cols, row))
+            is_exhausted = True
+        except aiosqlite.OperationalError as exception:
+            if why is None:
+                raise RuntimeError(explain(exception, f"executing {sql}"))
+            else:
+                raise RuntimeError(explain(exception, f"executing {why}: {sql}"))
+        finally:
+            if cursor is not None:
+                await self.__release_cursor(cursor, pool, is_exhausted)
+
+    # ----------------------------------------------------------------------------------------
+    def __list_backups(self, directory, basename, suffix):
+        """
+        List the backup files in the directory, in no particular order.
+        Backup filenames are timestamped, so they sort oldest to newest.
+        """
+
+        prefix = f"{basename}."
+
+        try:
+            with os.scandir(directory) as entries:
+                return [
+                    f"{directory}/{entry.name}"
+                    for entry in entries
+                    if entry.name.startswith(prefix)
+                    and entry.name.endswith(suffix)
+                    and len(entry.name) >= len(prefix) + len(suffix)
+                ]
+        except FileNotFoundError:
+            return []
+
+    # ----------------------------------------------------------------------------------------
+    async def __commit_for_backup(self, action):
+        """
+        Commit, so the connection is not in a transaction while sqlite's backup runs.
+        A backup with a write transaction open on the connection never finishes.
+        """
+
+        # Commit is deferred inside a transaction() context, so it can't close it off.
+        if self.__in_transaction:
+            raise RuntimeError(f"cannot {action} database inside a transaction")
+
+        await self.commit()
+
+        if self.__connection.in_transaction:
+            raise RuntimeError(f"cannot {action} database while a transaction is open")
 
     # ----------------------------------------------------------------------------------------
     async def backup(self):
@@ -507,6 +1124,9 @@ class Aiosqlite:
         """
 
         async with self.__backup_restore_lock:
+            # Commit any uncommitted transactions so they are included in the backup.
+            await self.__commit_for_backup("back up")
+
             # Prune all the restores which were orphaned.
             directory = self.__backup_directory
             if directory is None:
@@ -514,30 +1134,33 @@ class Aiosqlite:
 
             basename, suffix = os.path.splitext(os.path.basename(self.__filename))
 
-            filenames = glob.glob(f"{directory}/{basename}.*{suffix}")
+            filenames = await asyncio.to_thread(
+                self.__list_backups, directory, basename, suffix
+            )
 
-            filenames.sort(reverse=True)
+            # Only the newest ones, which were orphaned by the last restore, are needed.
+            filenames = heapq.nlargest(self.__last_restore, filenames)
 
-            for restore in range(self.__last_restore):
-                logger.debug(
-                    f"[BACKPRU] removing {restore}-th restore {filenames[restore]}"
-                )
-                os.remove(filenames[restore])
+            for restore, filename in enumerate(filenames):
+                logger.debug("[BACKPRU] removing %d-th restore %s", restore, filename)
+                await asyncio.to_thread(os.remove, filename)
 
             self.__last_restore = 0
 
             timestamp = isodatetime_filename()
             to_filename = f"{directory}/{basename}.{timestamp}{suffix}"
 
-            await self.disconnect()
+            # Use sqlite's online backup, which copies pages while the database stays open.
             try:
                 await self.__create_directory(to_filename)
-                shutil.copy2(self.__filename, to_filename)
-                logger.debug(f"backed up to {to_filename}")
+                target = await aiosqlite.connect(to_filename)
+                try:
+                    await self.__connection.backup(target)
+                finally:
+                    await target.close()
+                logger.debug("backed up to %s", to_filename)
             except Exception:
                 raise RuntimeError(f"copy {self.__filename} to {to_filename} failed")
-            finally:
-                await self.connect()
 
     # ----------------------------------------------------------------------------------------
     async def restore(self, nth):
@@ -546,33 +1169,45 @@ class Aiosqlite:
         """
 
         async with self.__backup_restore_lock:
+            # Commit any uncommitted transactions, the backup target can't be in one.
+            await self.__commit_for_backup("restore")
+
             directory = self.__backup_directory
             if directory is None:
                 raise RuntimeError("no backup directory supplied in confirmation")
 
             basename, suffix = os.path.splitext(os.path.basename(self.__filename))
 
-            filenames = glob.glob(f"{directory}/{basename}.*{suffix}")
-
-            filenames.sort(reverse=True)
+            filenames = await asyncio.to_thread(
+                self.__list_backups, directory, basename, suffix
+            )
 
             if nth >= len(filenames):
                 raise RuntimeError(
                     f"restoration index {nth} is more than available {len(filenames)}"
                 )
 
-            from_filename = filenames[nth]
+            # The nth newest backup.
+            from_filename = heapq.nlargest(nth + 1, filenames)[nth]
+
+            self.__query_cache.clear()
+            self.__columns_cache.clear()
 
-            await self.disconnect()
+            # Use sqlite's online backup in reverse, which overwrites the open database.
             try:
-                shutil.copy2(from_filename, self.__filename)
+                source = await aiosqlite.connect(from_filename)
+                try:
+                    await source.backup(self.__connection)
+                finally:
+                    await source.close()
                 logger.debug(
-                    f"restored nth {nth} out of {len(filenames)} from {from_filename}"
+                    "restored nth %d out of %d from %s",
+                    nth,
+                    len(filenames),
+                    from_filename,
                 )
             except Exception:
                 raise RuntimeError(f"copy {from_filename} to {self.__filename} failed")
-            finally:
-                await self.connect()
 
             self.__last_restore = nth
 
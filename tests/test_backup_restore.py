@@ -1,5 +1,7 @@
 import logging
 
+import pytest
+
 from dls_normsql.constants import ClassTypes, CommonFieldnames
 from dls_normsql.databases import Databases
 from tests.base_tester import BaseTester
@@ -71,6 +73,11 @@ class DatabaseTester(BaseTester):
             # Backup again (with bulk records)
             await database.backup()
 
+            # Backup can't be done inside a transaction.
+            with pytest.raises(RuntimeError):
+                async with database.transaction():
+                    await database.backup()
+
             # Restore one in the past (when it had a single record).
             await database.restore(1)
             records = await database.query(all_sql)
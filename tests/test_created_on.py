@@ -0,0 +1,121 @@
+import logging
+import time
+
+import pytest
+
+from dls_normsql.aiosqlite import created_on_isoformat
+from dls_normsql.constants import ClassTypes, CommonFieldnames
+from dls_normsql.databases import Databases
+from dls_normsql.table_definition import TableDefinition
+from tests.base_tester import BaseTester
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------------------
+class TestCreatedOn:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the default created_on values of the sqlite implementation of Database.
+        """
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+        }
+
+        # Test direct SQL access to the database.
+        CreatedOnTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
+# ----------------------------------------------------------------------------------------
+class IntegerCreatedOnTableDefinition(TableDefinition):
+    """
+    A database table definition with an integer created_on.
+    """
+
+    def __init__(self):
+        TableDefinition.__init__(self, "integer_created_on_table")
+
+        self.fields[CommonFieldnames.UUID] = {
+            "type": "TEXT PRIMARY KEY",
+            "index": True,
+        }
+
+        self.fields[CommonFieldnames.CREATED_ON] = {"type": "INTEGER", "index": True}
+
+
+# ----------------------------------------------------------------------------------------
+class IntegerCreatedOnDatabaseDefinition:
+    """
+    Database definition with only the integer created_on table.
+    """
+
+    def __init__(self):
+        self.LATEST_REVISION = 1
+
+    async def apply_revision(self, database, revision):
+        pass
+
+    async def add_table_definitions(self, database):
+        database.add_table_definition(IntegerCreatedOnTableDefinition())
+
+
+# ----------------------------------------------------------------------------------------
+class CreatedOnTester(BaseTester):
+    """
+    Test default created_on values.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = IntegerCreatedOnDatabaseDefinition()
+        databases = Databases()
+        database = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        try:
+            # Connect to database.
+            await database.connect()
+
+            before = time.time_ns() // 1000
+            await database.insert(
+                "integer_created_on_table",
+                [{CommonFieldnames.UUID: "a0"}, {CommonFieldnames.UUID: "a1"}],
+            )
+            after = time.time_ns() // 1000
+
+            records = await database.query(
+                "SELECT * FROM integer_created_on_table ORDER BY uuid"
+            )
+            assert len(records) == 2
+            created_on = records[0][CommonFieldnames.CREATED_ON]
+            assert isinstance(created_on, int)
+            assert before <= created_on <= after
+            assert records[1][CommonFieldnames.CREATED_ON] == created_on
+
+            # Text created_on, as in the revision table, keeps the isoformat text.
+            records = await database.query("SELECT * FROM revision")
+            assert records[0][CommonFieldnames.CREATED_ON] <= created_on_isoformat(
+                after
+            )
+            assert len(created_on_isoformat(created_on)) == len(
+                "2000-01-01 00:00:00.000000"
+            )
+
+            # Rows missing keys which the first row has are refused.
+            with pytest.raises(KeyError):
+                await database.insert(
+                    "integer_created_on_table",
+                    [{CommonFieldnames.UUID: "a2"}, {}],
+                )
+
+        finally:
+            # Disconnect from the database... necessary to allow asyncio loop to exit.
+            await database.disconnect()
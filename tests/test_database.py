@@ -1,5 +1,6 @@
 import logging
 
+import pytest
 from dls_utilpack.envvar import Envvar
 
 from dls_normsql.constants import ClassTypes, CommonFieldnames
@@ -30,6 +31,50 @@ class TestDatabaseAiosqlite:
         )
 
 
+# ----------------------------------------------------------------------------------------
+class TestDatabaseAiosqliteReader:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the sqlite implementation of Database with a read-only connection for queries.
+        """
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+            "type_specific_tbd": {"reader_connection": True},
+        }
+
+        # Test direct SQL access to the database.
+        DatabaseTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
+# ----------------------------------------------------------------------------------------
+class TestDatabaseAiosqliteRe2:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the sqlite implementation of Database with re2 behind REGEXP.
+        """
+
+        pytest.importorskip("re2")
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+            "type_specific_tbd": {"regexp_engine": "re2"},
+        }
+
+        # Test direct SQL access to the database.
+        DatabaseTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
 # ----------------------------------------------------------------------------------------
 class TestDatabaseAiomysql:
     def test(self, logging_setup, output_directory):
@@ -106,6 +151,29 @@ class DatabaseTester(BaseTester):
             records = await database1.query(all_sql)
             assert len(records) == 2
 
+            # Query with a regular expression, twice to use the compiled pattern again.
+            regexp_sql = "SELECT * FROM my_table WHERE my_field REGEXP ?"
+            records = await database1.query(regexp_sql, ["x00[1-9]"])
+            assert len(records) == 1
+            records = await database1.query(regexp_sql, ["x00[1-9]"])
+            assert len(records) == 1
+
+            # Patterns only Python's re understands.
+            if database_specification["type"] == ClassTypes.AIOSQLITE:
+                # An inline unicode flag can't be used with the ASCII-only compilation.
+                records = await database1.query(regexp_sql, ["(?u)x00[1-9]"])
+                assert len(records) == 1
+
+                # Escapes naming non-ASCII characters can still case-fold to ASCII.
+                literal_sql = "SELECT 'K' REGEXP ? AS matched"
+                for pattern in [
+                    r"(?i)\N{KELVIN SIGN}",
+                    r"(?i)\u212a",
+                    r"(?i)\U0000212a",
+                ]:
+                    records = await database1.query(literal_sql, [pattern])
+                    assert records[0]["matched"] == 1
+
             # Bulk insert more records to test multiple substitutions.
             insertable_records = [
                 ["f1", "{'a': 'f111'}"],
@@ -182,6 +250,41 @@ class DatabaseTester(BaseTester):
             records = await database1.query(all_sql)
             assert len(records) == 7
 
+            # ------------------------------------------------------------
+            # Several inserts inside a single transaction.
+            async with database1.transaction():
+                await database1.insert(
+                    "my_table",
+                    [{CommonFieldnames.UUID: "t1", "my_field": "{'t': 't111'}"}],
+                )
+                await database1.insert(
+                    "my_table",
+                    [{CommonFieldnames.UUID: "t2", "my_field": "{'t': 't112'}"}],
+                )
+
+                # Commit inside the transaction is deferred to its end.
+                await database1.commit()
+
+                # Second database should not see the uncommitted inserts.
+                records = await database2.query(all_sql)
+                assert len(records) == 7
+
+            # Second database should now see the committed inserts.
+            records = await database2.query(all_sql)
+            assert len(records) == 9
+
+            # Exception inside the transaction rolls it back.
+            with pytest.raises(RuntimeError):
+                async with database1.transaction():
+                    await database1.insert(
+                        "my_table",
+                        [{CommonFieldnames.UUID: "t3", "my_field": "{'t': 't113'}"}],
+                    )
+                    raise RuntimeError("deliberate failure inside transaction")
+
+            records = await database1.query(all_sql)
+            assert len(records) == 9
+
         finally:
             # Disonnect from the databases... necessary to allow asyncio loop to exit.
             await database2.disconnect()
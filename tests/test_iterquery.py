@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from contextlib import aclosing
+
+from dls_normsql.aiosqlite import QUERY_CHUNK_SIZE
+from dls_normsql.constants import ClassTypes, CommonFieldnames
+from dls_normsql.databases import Databases
+from tests.base_tester import BaseTester
+from tests.my_database_definition import MyDatabaseDefinition
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------------------
+class TestIterquery:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the iterquery method of the sqlite implementation of Database.
+        """
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+        }
+
+        # Test direct SQL access to the database.
+        IterqueryTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
+# ----------------------------------------------------------------------------------------
+class TestIterqueryStoppedEarly:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests writing after stopping an iterquery early, without and with a reader connection.
+        """
+
+        for reader_connection in [False, True]:
+            # Database specification.
+            database_specification = {
+                "type": ClassTypes.AIOSQLITE,
+                "filename": f"{output_directory}/database_{reader_connection}.sqlite",
+                "type_specific_tbd": {"reader_connection": reader_connection},
+            }
+
+            # Test direct SQL access to the database.
+            IterqueryStoppedEarlyTester().main(
+                database_specification,
+                output_directory,
+            )
+
+
+# ----------------------------------------------------------------------------------------
+class TestIterqueryReconnected:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests an iterquery finishing while the database reconnects, without and with a reader connection.
+        """
+
+        for reader_connection in [False, True]:
+            # Database specification.
+            database_specification = {
+                "type": ClassTypes.AIOSQLITE,
+                "filename": f"{output_directory}/database_{reader_connection}.sqlite",
+                "type_specific_tbd": {"reader_connection": reader_connection},
+            }
+
+            # Test direct SQL access to the database.
+            IterqueryReconnectedTester().main(
+                database_specification,
+                output_directory,
+            )
+
+
+# ----------------------------------------------------------------------------------------
+class IterqueryStoppedEarlyTester(BaseTester):
+    """
+    Test that stopping an iterquery early leaves nothing locked or stale.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = MyDatabaseDefinition()
+        databases = Databases()
+        database = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        count_sql = "SELECT COUNT(*) AS count FROM my_table"
+
+        try:
+            # Connect to database.
+            await database.connect()
+
+            # More records than are fetched in one chunk.
+            bulk_count = 3 * QUERY_CHUNK_SIZE
+            await database.insert(
+                "my_table",
+                [{CommonFieldnames.UUID: "b%05d" % (i)} for i in range(bulk_count)],
+            )
+            await database.commit()
+
+            # Put more than one cursor in the pool.
+            await asyncio.gather(database.query(count_sql), database.query(count_sql))
+
+            # Stop iterating after the first record.
+            async with aclosing(
+                database.iterquery("SELECT * FROM my_table")
+            ) as records:
+                async for record in records:
+                    break
+
+            # A new record is seen by the next query.
+            await database.insert("my_table", [{CommonFieldnames.UUID: "c0"}])
+            await database.commit()
+            records = await database.query(count_sql)
+            assert records[0]["count"] == bulk_count + 1
+
+            # The table is not left locked.
+            await database.create_table("my_table")
+            records = await database.query(count_sql)
+            assert records[0]["count"] == 0
+
+        finally:
+            # Disconnect from the database... necessary to allow asyncio loop to exit.
+            await database.disconnect()
+
+
+# ----------------------------------------------------------------------------------------
+class IterqueryReconnectedTester(BaseTester):
+    """
+    Test that a cursor from before a reconnect is not reused after it.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = MyDatabaseDefinition()
+        databases = Databases()
+        database = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        count_sql = "SELECT COUNT(*) AS count FROM my_table"
+
+        try:
+            # Connect to database.
+            await database.connect()
+
+            bulk_count = 10
+            await database.insert(
+                "my_table",
+                [{CommonFieldnames.UUID: "b%05d" % (i)} for i in range(bulk_count)],
+            )
+            await database.commit()
+
+            last_record_read = asyncio.Event()
+
+            async def read_all():
+                count = 0
+                async for record in database.iterquery("SELECT * FROM my_table"):
+                    count += 1
+                    if count == bulk_count:
+                        last_record_read.set()
+                return count
+
+            # Reconnect while the iterquery is fetching to find there are no more records.
+            async def reconnect():
+                await last_record_read.wait()
+                await database.disconnect()
+                await database.connect()
+
+            count, _ = await asyncio.gather(read_all(), reconnect())
+            assert count == bulk_count
+
+            # Queries work on the new connection.
+            for _ in range(2):
+                records = await database.query(count_sql)
+                assert records[0]["count"] == bulk_count
+
+        finally:
+            # Disconnect from the database... necessary to allow asyncio loop to exit.
+            await database.disconnect()
+
+
+# ----------------------------------------------------------------------------------------
+class IterqueryTester(BaseTester):
+    """
+    Test iterating over query results.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = MyDatabaseDefinition()
+        databases = Databases()
+        database = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        try:
+            # Connect to database.
+            await database.connect()
+
+            # Bulk insert more records than fit in one fetch chunk.
+            insertable_records = []
+            bulk_count = 200
+            for i in range(bulk_count):
+                insertable_records.append(
+                    {
+                        CommonFieldnames.UUID: "b%03d" % (i),
+                        "my_field": "{'b': '%03d'}" % (i),
+                    }
+                )
+            await database.insert("my_table", insertable_records)
+
+            all_sql = f"SELECT {CommonFieldnames.UUID}, my_field FROM my_table ORDER BY {CommonFieldnames.UUID}"
+
+            # Iterated records should match the queried ones.
+            records = await database.query(all_sql)
+            assert len(records) == bulk_count
+            iterated_records = [record async for record in database.iterquery(all_sql)]
+            assert iterated_records == records
+            assert list(iterated_records[0].keys()) == [
+                CommonFieldnames.UUID,
+                "my_field",
+            ]
+
+            # Iterate with substitutions.
+            count = 0
+            async for record in database.iterquery(
+                f"SELECT * FROM my_table WHERE {CommonFieldnames.UUID} < ?", ["b010"]
+            ):
+                count += 1
+            assert count == 10
+
+        finally:
+            # Disconnect from the database... necessary to allow asyncio loop to exit.
+            await database.disconnect()
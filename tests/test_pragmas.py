@@ -0,0 +1,74 @@
+import logging
+
+from dls_normsql.constants import ClassTypes
+from dls_normsql.databases import Databases
+from tests.base_tester import BaseTester
+from tests.my_database_definition import MyDatabaseDefinition
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------------------
+class TestPragmas:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the pragmas issued on connect by the sqlite implementation of Database.
+        """
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+            "type_specific_tbd": {
+                "pragmas": {
+                    "synchronous": "FULL",
+                    "mmap_size": None,
+                }
+            },
+        }
+
+        # Test direct SQL access to the database.
+        PragmasTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
+# ----------------------------------------------------------------------------------------
+class PragmasTester(BaseTester):
+    """
+    Test the pragmas in effect after connecting.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = MyDatabaseDefinition()
+        databases = Databases()
+        database = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        try:
+            # Connect to database.
+            await database.connect()
+
+            # Default pragma.
+            records = await database.query("PRAGMA journal_mode")
+            assert records[0]["journal_mode"] == "wal"
+
+            # Default pragma.
+            records = await database.query("PRAGMA cache_size")
+            assert records[0]["cache_size"] == -65536
+
+            # Pragma overridden in the specification (FULL is 2).
+            records = await database.query("PRAGMA synchronous")
+            assert records[0]["synchronous"] == 2
+
+            # Pragma dropped in the specification keeps sqlite's default.
+            records = await database.query("PRAGMA mmap_size")
+            assert records[0]["mmap_size"] == 0
+
+        finally:
+            # Disconnect from the database... necessary to allow asyncio loop to exit.
+            await database.disconnect()
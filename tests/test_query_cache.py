@@ -0,0 +1,125 @@
+import logging
+
+import pytest
+
+from dls_normsql.constants import ClassTypes, CommonFieldnames
+from dls_normsql.databases import Databases
+from tests.base_tester import BaseTester
+from tests.my_database_definition import MyDatabaseDefinition
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------------------------
+class TestQueryCache:
+    def test(self, logging_setup, output_directory):
+        """
+        Tests the cacheable queries of the sqlite implementation of Database.
+        """
+
+        # Database specification.
+        database_specification = {
+            "type": ClassTypes.AIOSQLITE,
+            "filename": f"{output_directory}/database.sqlite",
+            "type_specific_tbd": {"query_cache_ttl": 3600.0},
+        }
+
+        # Test direct SQL access to the database.
+        QueryCacheTester().main(
+            database_specification,
+            output_directory,
+        )
+
+
+# ----------------------------------------------------------------------------------------
+class QueryCacheTester(BaseTester):
+    """
+    Test caching of query results.
+    """
+
+    async def _main_coroutine(self, database_specification, output_directory):
+        """ """
+
+        database_definition_object = MyDatabaseDefinition()
+        databases = Databases()
+        database1 = databases.build_object(
+            database_specification, database_definition_object
+        )
+        database2 = databases.build_object(
+            database_specification, database_definition_object
+        )
+
+        all_sql = "SELECT * FROM my_table"
+
+        try:
+            # Connect to database.
+            await database1.connect()
+
+            # Connect to second database.
+            await database2.connect()
+
+            # Write one record.
+            await database1.insert(
+                "my_table",
+                [{CommonFieldnames.UUID: "a0", "my_field": "{'a': 'a000'}"}],
+            )
+            await database1.commit()
+
+            records = await database1.query(all_sql, cacheable=True)
+            assert len(records) == 1
+
+            # Modifying the returned records doesn't affect the cache.
+            records[0]["my_field"] = "modified"
+            records = await database1.query(all_sql, cacheable=True)
+            assert records[0]["my_field"] == "{'a': 'a000'}"
+
+            # Write from the second database is not seen in the cached records.
+            await database2.insert(
+                "my_table",
+                [{CommonFieldnames.UUID: "a1", "my_field": "{'a': 'a001'}"}],
+            )
+            await database2.commit()
+            records = await database1.query(all_sql, cacheable=True)
+            assert len(records) == 1
+
+            # But it is seen by a query which is not cacheable.
+            records = await database1.query(all_sql)
+            assert len(records) == 2
+
+            # Write from the first database invalidates its cache.
+            await database1.insert(
+                "my_table",
+                [{CommonFieldnames.UUID: "a2", "my_field": "{'a': 'a002'}"}],
+            )
+            records = await database1.query(all_sql, cacheable=True)
+            assert len(records) == 3
+
+            # Substitutions are part of what is cached.
+            subs_sql = f"SELECT * FROM my_table WHERE {CommonFieldnames.UUID} = ?"
+            records = await database1.query(subs_sql, ["a0"], cacheable=True)
+            assert len(records) == 1
+            records = await database1.query(subs_sql, ["x0"], cacheable=True)
+            assert len(records) == 0
+
+            # Rollback invalidates the cache.
+            await database1.rollback()
+            records = await database1.query(all_sql, cacheable=True)
+            assert len(records) == 2
+
+            # Rollback of a failed transaction also invalidates the cache.
+            with pytest.raises(RuntimeError):
+                async with database1.transaction():
+                    await database1.insert(
+                        "my_table",
+                        [{CommonFieldnames.UUID: "a3", "my_field": "{'a': 'a003'}"}],
+                    )
+                    records = await database1.query(all_sql, cacheable=True)
+                    assert len(records) == 3
+                    raise RuntimeError("abandon the transaction")
+            records = await database1.query(all_sql, cacheable=True)
+            assert len(records) == 2
+
+        finally:
+            # Disconnect from the databases... necessary to allow asyncio loop to exit.
+            await database2.disconnect()
+            await database1.disconnect()